@@ -26,15 +26,25 @@ SOFTWARE.
 '''
 
 import os
+import atexit
+import collections
+import dbm
+import functools
+import asyncio
 import logging
+import shelve
 
 import MySQLdb
 
-import requests
+import numpy as np
 
-import time
+import aiohttp
+
+import ijson
 
 class Prediction():
+    __slots__ = ('rev_id', 'rating', 'probs', 'p_above_target')
+
     def __init__(self, revision_id, rating, probs):
         '''
         A prediction for a given revision consists of a rating
@@ -46,8 +56,9 @@ class Prediction():
         :param rating: The predicted assessment class
         :type rating: str
 
-        :param probs: A set of probabilities per assessment class.
-        :type probs: dict
+        :param probs: Probabilities per assessment class, in the same
+                      order as the WP 1.0 assessment scale.
+        :type probs: tuple (of floats)
         '''
         self.rev_id = revision_id
         self.rating = rating
@@ -69,6 +80,9 @@ class Predictor():
         ## Note that we use case-insensitive scoring
         self.wp10 = ['FA', 'GA', 'B', 'C', 'Start', 'Stub']
 
+        ## Mapping from assessment class to its index in the scale
+        self.wp10_map = {rating: idx for idx, rating in enumerate(self.wp10)}
+
         ## The number of revisions we will retrieve predictions for
         ## with every request to ORES
         self.iter_size = 50
@@ -76,6 +90,24 @@ class Predictor():
         ## Max number of attempts we'll make to ORES for a set of predictions
         self.max_url_attempts = 3
 
+        ## Max number of concurrent requests we'll make to ORES
+        self.max_concurrent_requests = 10
+
+        ## Base delay (in seconds) between attempts to ORES, doubled
+        ## for every failed attempt
+        self.retry_backoff = 0.5
+
+        ## Persistent HTTP session and the event loop it lives on, created
+        ## on first use and reused across calls so connections are kept alive
+        self.http_loop = None
+        self.http_session = None
+        self.http_semaphore = None
+        atexit.register(self.close_http_session)
+
+        ## The number of rows we will fetch at a time when streaming
+        ## results from the database
+        self.db_fetch_size = 10000
+
         self.lang = 'en'
         self.db_conf = "~/replica.my.cnf"
         self.db_server = "enwiki.labsdb"
@@ -83,6 +115,79 @@ class Predictor():
         self.db_conn = None
         self.db_cursor = None
 
+        ## Persistent cache of predictions, keyed by
+        ## "{lang}:{model version}:{rev_id}". Scores only change when
+        ## the ORES model is retrained, so including the model version
+        ## in the key lets us keep them across runs. The cache is opened
+        ## on first use, set cache_file to None to run without it.
+        self.cache_file = "~/.ores_cache"
+        self.cache = None
+        self.cache_opened = False
+
+        ## Version of the pickled Prediction format stored in the cache,
+        ## bump it when Prediction changes so stale entries are dropped
+        self.cache_version = 4
+        atexit.register(self.close_cache)
+
+        ## Version of the ORES wp10 model per wiki, looked up once per run
+        self.model_versions = {}
+
+        ## In-memory LRU cache of predictions, keyed by (lang, rev_id),
+        ## so repeated lookups within a run skip the persistent cache
+        self.rev_cache = collections.OrderedDict()
+        self.rev_cache_size = 100000
+
+    def open_cache(self):
+        '''
+        Open the persistent prediction cache if we have not tried to
+        already. Returns the cache, or None if caching is disabled or
+        the cache could not be opened (e.g. because another process
+        holds the lock on it).
+        '''
+        if self.cache_opened:
+            return(self.cache)
+
+        self.cache_opened = True
+        if not self.cache_file:
+            return(None)
+
+        try:
+            self.cache = shelve.open(os.path.expanduser(self.cache_file))
+            if self.cache.get('__version__') != self.cache_version:
+                self.cache.clear()
+                self.cache['__version__'] = self.cache_version
+        except dbm.error as e:
+            logging.warning('Unable to open prediction cache {}, running without it'.format(self.cache_file))
+            logging.warning('{}'.format(e))
+            self.close_cache()
+
+        return(self.cache)
+
+    def close_cache(self):
+        '''Close the persistent prediction cache.'''
+        try:
+            self.cache.close()
+        except:
+            pass
+
+        self.cache = None
+        return()
+
+    def close_http_session(self):
+        '''Close our HTTP session and the event loop it runs on.'''
+        try:
+            if self.http_session:
+                self.http_loop.run_until_complete(self.http_session.close())
+            self.http_loop.close()
+        except:
+            pass
+
+        self.http_session = None
+        self.http_semaphore = None
+        self.http_loop = None
+        self.model_versions = {}
+        return()
+
     def db_connect(self):
         '''
         Connect to the database. Returns True if successful.
@@ -92,7 +197,7 @@ class Predictor():
         try:
             self.db_conn = MySQLdb.connect(db=self.db_name,
                                            host=self.db_server,
-                                           charset='utf8',
+                                           charset='utf8mb4',
                                            use_unicode=True,
                                            read_default_file=os.path.expanduser(self.db_conf))
             self.db_cursor = self.db_conn.cursor(MySQLdb.cursors.SSDictCursor)
@@ -115,11 +220,107 @@ class Predictor():
 
         return()
 
-    def get_predictions(self, rev_ids):
+    async def _fetch_one(self, session, url, langcode, semaphore):
         '''
-        For the given list of revision IDs, fetch predictions for them,
+        Fetch predictions for a single batch of revisions from ORES,
         returning a dictionary mapping revision ID to Prediction objects.
 
+        :param session: The HTTP session to make the request with.
+        :type session: aiohttp.ClientSession
+
+        :param url: The ORES URL to request.
+        :type url: str
+
+        :param langcode: ORES identifier of the wiki, e.g. "enwiki"
+        :type langcode: str
+
+        :param semaphore: Semaphore limiting the number of concurrent requests.
+        :type semaphore: asyncio.Semaphore
+        '''
+
+        # where the per-revision scores are found in the response
+        scores_prefix = 'scores.{}.wp10.scores'.format(langcode)
+        wp10 = self.wp10
+
+        num_attempts = 0
+        while num_attempts < self.max_url_attempts:
+            num_attempts += 1
+            predictions = dict()
+            async with semaphore:
+                try:
+                    async with session.get(url) as r:
+                        if r.status == 200:
+                            # stream the response, walking straight to
+                            # the scores rather than decoding all of it
+                            async for revid, score_data in ijson.kvitems_async(
+                                    r.content, scores_prefix, use_float=True):
+                                probs = score_data['probability']
+                                revid = int(revid)
+                                predictions[revid] = Prediction(revid,
+                                                               score_data['prediction'],
+                                                               tuple(probs[c] for c in wp10))
+
+                            if predictions:
+                                break
+
+                            logging.warning("ORES response keys not as expected")
+                            logging.warning("url={}".format(url))
+                except ijson.JSONError:
+                    logging.warning("Unable to decode ORES response as JSON")
+                    logging.warning("url={}".format(url))
+                except KeyError:
+                    logging.warning("ORES response keys not as expected")
+                    logging.warning("url={}".format(url))
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logging.warning("Request to ORES failed: {!r}".format(e))
+                    logging.warning("url={}".format(url))
+
+            # something didn't go right, let's wait and try again
+            if num_attempts < self.max_url_attempts:
+                await asyncio.sleep(self.retry_backoff * 2 ** (num_attempts - 1))
+
+        return(predictions)
+
+    async def _fetch_model_version(self, session, langcode):
+        '''
+        Fetch the version of the ORES wp10 model for the given wiki,
+        returning None if we could not get it.
+
+        :param session: The HTTP session to make the request with.
+        :type session: aiohttp.ClientSession
+
+        :param langcode: ORES identifier of the wiki, e.g. "enwiki"
+        :type langcode: str
+        '''
+        url = '{ores_url}{langcode}/wp10/'.format(ores_url=self.ORES_url,
+                                                  langcode=langcode)
+        try:
+            async with session.get(url) as r:
+                if r.status == 200:
+                    response = await r.json(content_type=None)
+                    return(response['scores'][langcode]['wp10']['version'])
+        except (ValueError, KeyError,
+                aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+        logging.warning("Unable to get the ORES model version, not using the prediction cache")
+        logging.warning("url={}".format(url))
+        return(None)
+
+    def _forget_model_version(self, langcode, future):
+        '''
+        Drop a model version lookup that was cancelled or failed, so
+        the next request for that wiki looks the version up again.
+        '''
+        if future.cancelled() or future.exception() is not None:
+            if self.model_versions.get(langcode) is future:
+                del self.model_versions[langcode]
+
+    async def _get_predictions_async(self, rev_ids):
+        '''
+        Fetch predictions for the given list of revision IDs, using
+        predictions we already have in memory and fetching the rest.
+
         :param rev_ids: The revision IDs we are predicting for
         :type rev_ids: list (of ints)
         '''
@@ -127,49 +328,262 @@ class Predictor():
         ## The mapping dictionary we will return
         predictions = dict()
 
+        missing = []
+        for rev_id in set(rev_ids):
+            key = (self.lang, rev_id)
+            try:
+                predictions[rev_id] = self.rev_cache[key]
+                self.rev_cache.move_to_end(key)
+            except KeyError:
+                missing.append(rev_id)
+
+        if missing:
+            fetched = await self._fetch_uncached(missing)
+            for rev_id, prediction in fetched.items():
+                self.rev_cache[(self.lang, rev_id)] = prediction
+            predictions.update(fetched)
+
+            # evict the least recently used predictions
+            while len(self.rev_cache) > self.rev_cache_size:
+                self.rev_cache.popitem(last=False)
+
+        return(predictions)
+
+    async def _fetch_uncached(self, rev_ids):
+        '''
+        Fetch predictions for the given list of revision IDs from the
+        persistent cache, making concurrent requests to ORES, one per
+        batch of revisions, for those that are not in it.
+
+        :param rev_ids: The unique revision IDs we are predicting for
+        :type rev_ids: list (of ints)
+        '''
+
+        ## The mapping dictionary we will return
+        predictions = dict()
+
         # ORES uses "{lang}wiki" as identifiers of the wiki
         langcode = "{}wiki".format(self.lang)
-        
-        http_session = requests.Session()
-        i = 0
-        while i < len(rev_ids):
-            subset = rev_ids[i:i + self.iter_size]
+
+        if not self.http_session:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrent_requests)
+            self.http_session = aiohttp.ClientSession(headers=self.headers,
+                                                      connector=connector)
+            self.http_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        # the cache is keyed on the model version, without it we
+        # cannot tell whether cached predictions are stale. Batches run
+        # concurrently, so share a single lookup between them.
+        cache = self.open_cache()
+        if cache is not None:
+            if langcode not in self.model_versions:
+                self.model_versions[langcode] = asyncio.ensure_future(
+                    self._fetch_model_version(self.http_session, langcode))
+                self.model_versions[langcode].add_done_callback(
+                    functools.partial(self._forget_model_version, langcode))
+            # shield the shared lookup so cancelling this batch does not
+            # cancel it for all the others
+            model_version = await asyncio.shield(self.model_versions[langcode])
+            if model_version is None:
+                cache = None
+
+        # use cached predictions where we have them, only revisions
+        # we have not seen before are sent to ORES
+        missing = []
+        for rev_id in rev_ids:
+            if cache is not None:
+                cache_key = '{}:{}:{}'.format(self.lang, model_version, rev_id)
+                if cache_key in cache:
+                    predictions[rev_id] = cache[cache_key]
+                    continue
+
+            missing.append(rev_id)
+
+        logging.debug('Found {} of {} predictions in the cache'.format(
+            len(rev_ids) - len(missing), len(rev_ids)))
+
+        # build the URL up to the revision IDs once, the language can
+        # change between calls so it's not done in __init__
+        url_prefix = '{ores_url}{langcode}/wp10/?revids='.format(
+            ores_url=self.ORES_url,
+            langcode=langcode)
+
+        tasks = []
+        for i in range(0, len(missing), self.iter_size):
+            subset = missing[i:i + self.iter_size]
             # make a request to score the revisions
-            url = '{ores_url}{langcode}/wp10/?revids={revids}'.format(
-                ores_url=self.ORES_url,
-                langcode=langcode,
-                revids='|'.join([str(rev_id) for rev_id in subset]))
+            url = url_prefix + '|'.join(map(str, subset))
 
             logging.debug('Requesting predictions for {n} pages from ORES'.format(n=len(subset)))
 
-            num_attempts = 0
-            while num_attempts < self.max_url_attempts:
-                r = http_session.get(url,
-                                     headers=self.headers)
-                num_attempts += 1
-                if r.status_code == 200:
-                    try:
-                        response = r.json()
-                        revid_pred_map = response['scores'][langcode]['wp10']['scores']
-                        # iterate over returned predictions and store
-                        for revid, score_data in revid_pred_map.items():
-                            predictions[revid] = Prediction(revid,
-                                                           score_data['prediction'],
-                                                           score_data['probability'])
+            tasks.append(asyncio.create_task(
+                self._fetch_one(self.http_session, url, langcode,
+                                self.http_semaphore)))
 
-                        break
-                    except ValueError:
-                        logging.warning("Unable to decode ORES response as JSON")
-                        logging.warning("url={}".format(url))
-                    except KeyError:
-                        logging.warning("ORES response keys not as expected")
-                        logging.warning("url={}".format(url))
+        for batch_predictions in await asyncio.gather(*tasks):
+            if cache is not None:
+                for revid, prediction in batch_predictions.items():
+                    cache['{}:{}:{}'.format(self.lang, model_version,
+                                            revid)] = prediction
+            predictions.update(batch_predictions)
 
-                    # something didn't go right, let's wait and try again
-                    time.sleep(0.5)
+        return(predictions)
 
-            # update i to iterate to next batch
-            i += self.iter_size
+    def _run(self, coro):
+        '''
+        Run the given coroutine to completion on our persistent event loop,
+        creating the loop on first use.
+        '''
+        if not self.http_loop:
+            self.http_loop = asyncio.new_event_loop()
+
+        return(self.http_loop.run_until_complete(coro))
+
+    def get_predictions(self, rev_ids):
+        '''
+        For the given list of revision IDs, fetch predictions for them,
+        returning a dictionary mapping revision ID to Prediction objects.
+
+        :param rev_ids: The revision IDs we are predicting for
+        :type rev_ids: list (of ints)
+        '''
+        return(self._run(self._get_predictions_async(rev_ids)))
+
+    async def _get_members_and_predictions(self, category_name, art_rev_map):
+        '''
+        Find all articles in the given category and their latest revision,
+        filling in `art_rev_map`, and fetch predictions for them.
+        Reading rows from the database and requests to ORES are pipelined
+        through a queue so ORES starts scoring while we are still reading
+        rows. Returns a dictionary mapping revision ID to Prediction objects.
+
+        :param category_name: Name of the category (without namespace)
+        :type category_name: str
+
+        :param art_rev_map: Mapping from article title to revision ID
+        :type art_rev_map: dict
+        '''
+
+        # Query to get all articles in a given category together with
+        # their latest revision. The category can contain either the
+        # article or its talk page, the revision is always that of the
+        # article. Titles are retrieved without namespaces, converted
+        # from binary so the driver returns them as str, and
+        # page_latest is NULL if the article does not exist.
+        member_query = '''SELECT DISTINCT
+                          CONVERT(m.page_title USING utf8mb4) AS page_title,
+                          a.page_latest
+                          FROM categorylinks cl
+                          JOIN page m
+                          ON m.page_id=cl.cl_from
+                          LEFT JOIN page a
+                          ON a.page_title=m.page_title
+                          AND a.page_namespace=0
+                          WHERE cl.cl_to=%(category)s
+                          AND m.page_namespace IN (0, 1)'''
+
+        ## The mapping dictionary we will return
+        predictions = dict()
+
+        # unbounded, the cursor is unbuffered so we read it as fast as
+        # we can rather than hold the server up at the pace of ORES
+        queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+
+        async def producer():
+            # revisions already sent to the consumer, so we don't
+            # ask ORES to score the same revision twice
+            seen = set()
+
+            # the database driver blocks, run it in a worker thread
+            await loop.run_in_executor(None, self.db_cursor.execute,
+                                       member_query,
+                                       {'category': category_name.replace(' ',
+                                                                          '_')})
+            while True:
+                rows = await loop.run_in_executor(None,
+                                                  self.db_cursor.fetchmany,
+                                                  self.db_fetch_size)
+                if not rows:
+                    break
+
+                for row in rows:
+                    rev_id = row['page_latest'] or 0
+                    art_rev_map[row['page_title']] = rev_id
+                    if rev_id and rev_id not in seen:
+                        seen.add(rev_id)
+                        queue.put_nowait(rev_id)
+
+            # signal that there are no more revisions
+            queue.put_nowait(None)
+
+        async def consumer():
+            # batches currently being predicted, at most as many as we
+            # make concurrent requests to ORES
+            in_flight = set()
+
+            async def wait_for_batches(return_when):
+                done, _ = await asyncio.wait(in_flight,
+                                             return_when=return_when)
+                for task in done:
+                    in_flight.remove(task)
+                    predictions.update(task.result())
+
+            try:
+                batch = []
+                while True:
+                    rev_id = await queue.get()
+                    if rev_id is not None:
+                        batch.append(rev_id)
+
+                    if batch and (rev_id is None
+                                  or len(batch) == self.iter_size):
+                        if len(in_flight) >= self.max_concurrent_requests:
+                            await wait_for_batches(asyncio.FIRST_COMPLETED)
+                        in_flight.add(asyncio.create_task(
+                            self._get_predictions_async(batch)))
+                        batch = []
+
+                    if rev_id is None:
+                        break
+
+                if in_flight:
+                    await wait_for_batches(asyncio.ALL_COMPLETED)
+            finally:
+                for task in in_flight:
+                    task.cancel()
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+        # if either side fails or is cancelled, cancel the other one
+        # rather than leaving it running or waiting on the queue. The
+        # consumer only finishes on its own after the producer has.
+        producer_task = asyncio.create_task(producer())
+        consumer_task = asyncio.create_task(consumer())
+        finished = set()
+        pending = {producer_task, consumer_task}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                finished |= done
+                if consumer_task in done or any(
+                        task.cancelled() or task.exception() is not None
+                        for task in done):
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        for task in finished:
+            if not task.cancelled():
+                task.result()
+
+        if any(task.cancelled() for task in finished):
+            raise RuntimeError('Prediction pipeline was cancelled')
+
+        if pending:
+            raise RuntimeError('Prediction pipeline stopped before all revisions were read')
 
         return(predictions)
     
@@ -193,21 +607,6 @@ class Predictor():
         :type distance: int
         '''
 
-        # Query to get all articles/talk pages in a given category.
-        # Note that this query retrieves titles without namespaces.
-        member_query = '''SELECT page_title
-                          FROM page
-                          JOIN categorylinks
-                          ON page_id=cl_from
-                          WHERE cl_to=%(category)s
-                          AND page_namespace IN (0, 1)'''
-
-        # Query to get the latest revision of a given page by title
-        latest_query = '''SELECT page_latest
-                          FROM page
-                          WHERE page_title=%(title)s
-                          AND page_namespace=0'''
-        
         ## Mapping from article title to revision ID
         art_rev_map = dict()
 
@@ -222,62 +621,59 @@ class Predictor():
             logging.error('unable to connect to database')
             return()
         
-        # get all articles/talk pages in the category
-        self.db_cursor.execute(member_query,
-                               {'category': category_name.replace(' ',
-                                                                  '_')})
-        done = False
-        while not done:
-            row = self.db_cursor.fetchone()
-            if not row:
-                done = True
-                continue
-
-            page_title = row['page_title'].decode('utf-8')
-            art_rev_map[page_title] = -1
+        # get all articles in the category and their latest revision
+        # (page_latest in the page table), building a map from page title
+        # to revision ID, and retrieve predictions for them as they are
+        # found, building a map from revision ID to prediction
+        rev_pred_map = self._run(self._get_members_and_predictions(
+            category_name, art_rev_map))
 
         logging.info('Found {} members of the category'.format(len(art_rev_map)))
 
-        # find the latest revision ID of all the pages (use page_latest
-        # in the page table, build a map from page title to revision ID)
-        for page_title in art_rev_map.keys():
-            self.db_cursor.execute(latest_query,
-                                   {'title': page_title})
-            for row in self.db_cursor.fetchall():
-                art_rev_map[page_title] = str(row['page_latest'])
-
         # If we cannot find a latest revision for a given page, flag the title
-        del_list = []
-        for page_title, rev_id in art_rev_map.items():
-            if int(rev_id) <= 0:
-                logging.warning('could not find a latest revision for {}'.format(page_title))
-                del_list.append(page_title)
-
-        for page_title in del_list:
-            del(art_rev_map[page_title])
-                
-        # iterate over groups of revision IDs and retrieve predictions,
-        # building a map from revision ID to prediction
-        rev_pred_map = self.get_predictions(list(art_rev_map.values()))
-       
-        # iterate over the (page title, rev ID) map and for each:
+        dropped = [page_title for page_title, rev_id in art_rev_map.items()
+                   if rev_id <= 0]
+        for page_title in dropped:
+            logging.warning('could not find a latest revision for {}'.format(page_title))
+
+        art_rev_map = {page_title: rev_id
+                       for page_title, rev_id in art_rev_map.items()
+                       if rev_id > 0}
+
+        # for all predictions at once:
         #   check if the prediction is >= distance away
         #   calculate probability article rating is greater than target
-        wp10_map = { rating: idx for idx, rating in enumerate(self.wp10)}
+        wp10_map = self.wp10_map
         target_idx = wp10_map[target]
 
+        rev_ids = list(rev_pred_map.keys())
+        preds = list(rev_pred_map.values())
+        rating_idx = np.fromiter((wp10_map[pred.rating] for pred in preds),
+                                 dtype=np.int8, count=len(preds))
+
+        ## Is prediction more than 'distance' away from 'target'?
+        ## Only those that are need their probabilities summed.
+        keep_idx = np.flatnonzero((target_idx - rating_idx) >= distance)
+        probs = np.array([preds[idx].probs for idx in keep_idx],
+                         dtype=np.float32).reshape(-1, len(self.wp10))
+        p_above = probs[:, :target_idx].sum(axis=1)
+
+        ## Mapping from revision ID to a copy of its prediction with
+        ## P(> target) filled in. Cached predictions are shared between
+        ## calls with different targets, so they are never modified.
+        candidate_preds = {}
+        for idx, p in zip(keep_idx, p_above):
+            pred = preds[idx]
+            candidate = Prediction(pred.rev_id, pred.rating, pred.probs)
+            candidate.p_above_target = float(p)
+            candidate_preds[rev_ids[idx]] = candidate
+
+        # iterate over the (page title, rev ID) map and pick out the
+        # pages whose prediction is a candidate, revisions we don't
+        # have predictions for are not candidates
         for page_title, rev_id in art_rev_map.items():
-            try:
-                rev_pred = rev_pred_map[rev_id]
-            except KeyError:
-                # We don't have predictions for this revision
-                continue
-
-            ## Is prediction more than 'distance' away from 'target'?
-            if target_idx - wp10_map[rev_pred.rating] >= distance:
-                candidate_map[page_title] = rev_pred
-                for i in range(0, target_idx):
-                    rev_pred.p_above_target += rev_pred.probs[self.wp10[i]]
+            if rev_id in candidate_preds:
+                candidate_map[page_title] = candidate_preds[rev_id]
 
         return(candidate_map)
 
@@ -297,7 +693,6 @@ class Predictor():
 !  Title
 !  Predicted class
 !  P(> {})'''.format(target)
-        table_content = ''
         table_end = '''
 |}'''
         
@@ -307,14 +702,18 @@ class Predictor():
                                    key=lambda pred: pred[1].p_above_target,
                                    reverse=True)
 
+        rows = []
         for (page_title, pred) in sorted_candidates:
-            table_content = '''{content}
-|-
+            rows.append('''|-
 | [[{page_title}]] || {rating} || {prob:.1f}'''.format(
-    content=table_content, page_title=page_title.replace('_', ' '),
-    rating=pred.rating, prob=100*pred.p_above_target)
+    page_title=page_title.replace('_', ' '),
+    rating=pred.rating, prob=100*pred.p_above_target))
+
+        table_content = ''
+        if rows:
+            table_content = '\n' + '\n'.join(rows)
 
-        return('{}{}{}'.format(table_start, table_content, table_end))
+        return(''.join((table_start, table_content, table_end)))
 
 def main():
     # Parse CLI options